@@ -1,19 +1,106 @@
 import aiosqlite
+import asyncio
+import os
+import sqlite3
+import time
+from elo import calculate_elo
+from ranks import RANK_TIERS, tier_index
+
+DB_PATH = os.getenv("DB_PATH", "/data/db.sqlite")
+DEFAULT_RATING = 1000
+RATING_EXPORT_COLUMNS = ("player_id", "mode", "rating", "wins", "losses", "games", "last_played")
+RESULT_EXPORT_COLUMNS = ("result_id", "player_id", "opponent_id", "mode", "won", "rating", "rating_change", "played_at")
+HISTORY_PAGE_SIZE = 10
+EXPORT_CHUNK_SIZE = 1000
+IMPORT_BATCH_SIZE = 5000
+SCHEMA_VERSION = 2
+# Stored alongside tier_counts; when RANK_TIERS thresholds are edited the counts
+# were bucketed by the old boundaries and are rebuilt on the next start.
+TIER_FINGERPRINT = ",".join(str(tier.min_rating) for tier in RANK_TIERS)
+
+# Registered game modes -> players per team. Ratings are stored per mode in one
+# table, so adding a format is a register_mode() call, not a schema change.
+MODES = {}
+
+def register_mode(mode: str, team_size: int):
+    MODES[mode] = team_size
 
 async def initialize():
-    async with aiosqlite.connect("/data/db.sqlite") as db:
+    async with aiosqlite.connect(DB_PATH) as db:
+        # WAL lets long reads (exports) run alongside writes instead of blocking them.
+        # The setting is stored in the database file, so it only has to be set once.
+        await db.execute("PRAGMA journal_mode = WAL")
         await db.execute("""
         CREATE TABLE IF NOT EXISTS players (
-            id INTEGER PRIMARY KEY,
-            wins_1v1 INTEGER DEFAULT 0,
-            losses_1v1 INTEGER DEFAULT 0,
-            elo_1v1 INTEGER DEFAULT 1000,
-            wins_2v2 INTEGER DEFAULT 0,
-            losses_2v2 INTEGER DEFAULT 0,
-            elo_2v2 INTEGER DEFAULT 1000
+            id INTEGER PRIMARY KEY
         )
         """)
         await db.execute("""
+        CREATE TABLE IF NOT EXISTS ratings (
+            player_id INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            rating INTEGER NOT NULL DEFAULT 1000,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            games INTEGER NOT NULL DEFAULT 0,
+            last_played INTEGER,
+            PRIMARY KEY (player_id, mode)
+        ) WITHOUT ROWID
+        """)
+        # Covers leaderboard scans for any mode without touching the table
+        await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ratings_mode_rating
+        ON ratings (mode, rating DESC, player_id, wins, losses)
+        """)
+        # One row per player per rated result, newest first via the index
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            player_id INTEGER NOT NULL,
+            opponent_id INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            won INTEGER NOT NULL,
+            rating INTEGER NOT NULL,
+            rating_change INTEGER NOT NULL,
+            played_at INTEGER NOT NULL
+        )
+        """)
+        await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_results_player
+        ON results (player_id, played_at, result_id)
+        """)
+        await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_results_pair
+        ON results (player_id, opponent_id, played_at, result_id)
+        """)
+        # Running head-to-head totals, stored once per pair with player_a < player_b
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS head_to_head (
+            player_a INTEGER NOT NULL,
+            player_b INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            a_wins INTEGER NOT NULL DEFAULT 0,
+            b_wins INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (player_a, player_b, mode)
+        ) WITHOUT ROWID
+        """)
+        # Players per rank tier, kept up to date as ratings cross tier boundaries
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS tier_counts (
+            mode TEXT NOT NULL,
+            tier INTEGER NOT NULL,
+            players INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (mode, tier)
+        ) WITHOUT ROWID
+        """)
+        # Small key/value store for bookkeeping that is not worth a schema version
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID
+        """)
+        await db.execute("""
         CREATE TABLE IF NOT EXISTS matches (
             match_id INTEGER PRIMARY KEY,
             mode TEXT NOT NULL,
@@ -26,77 +113,255 @@ async def initialize():
         )
         """)
 
+        cursor = await db.execute("PRAGMA user_version")
+        (version,) = await cursor.fetchone()
+        if version < 1:
+            await _migrate_player_columns(db)
+        cursor = await db.execute("SELECT value FROM meta WHERE key = 'tier_thresholds'")
+        row = await cursor.fetchone()
+        if version < 2 or row is None or row[0] != TIER_FINGERPRINT:
+            await _rebuild_tier_counts(db)
+            await db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('tier_thresholds', ?)", (TIER_FINGERPRINT,)
+            )
+        await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
         await db.commit()
 
+async def _migrate_player_columns(db):
+    # Copies the old wins_<mode>/losses_<mode>/elo_<mode> columns into ratings.
+    # The old columns are left in place so the data can still be checked by hand.
+    cursor = await db.execute("PRAGMA table_info(players)")
+    column_names = {col[1] for col in await cursor.fetchall()}
+    for mode in ("1v1", "2v2"):
+        if f"elo_{mode}" not in column_names:
+            continue
+        await db.execute(f"""
+            INSERT OR IGNORE INTO ratings (player_id, mode, rating, wins, losses, games)
+            SELECT id, ?, elo_{mode}, wins_{mode}, losses_{mode}, wins_{mode} + losses_{mode}
+            FROM players
+            WHERE wins_{mode} + losses_{mode} > 0 OR elo_{mode} != ?
+        """, (mode, DEFAULT_RATING))
+
+async def _rebuild_tier_counts(db):
+    # One full pass over ratings; after this the counts are maintained incrementally.
+    counts = {}
+    cursor = await db.execute("SELECT mode, rating FROM ratings")
+    while True:
+        rows = await cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        for mode, rating in rows:
+            key = (mode, tier_index(rating))
+            counts[key] = counts.get(key, 0) + 1
+    await db.execute("DELETE FROM tier_counts")
+    await db.executemany(
+        "INSERT INTO tier_counts (mode, tier, players) VALUES (?, ?, ?)",
+        [(mode, tier, players) for (mode, tier), players in counts.items()]
+    )
+
+async def _bump_tier(db, mode: str, tier: int, delta: int):
+    await db.execute("""
+        INSERT INTO tier_counts (mode, tier, players) VALUES (?, ?, ?)
+        ON CONFLICT (mode, tier) DO UPDATE SET players = players + excluded.players
+        """, (mode, tier, delta)
+    )
+
+async def get_tier_counts(mode: str):
+    """Returns a list with the number of players in each RANK_TIERS tier for mode."""
+    counts = [0] * len(RANK_TIERS)
+    async with aiosqlite.connect(DB_PATH) as db:
+        cursor = await db.execute(
+            "SELECT tier, players FROM tier_counts WHERE mode = ?", (mode,)
+        )
+        for tier, players in await cursor.fetchall():
+            if 0 <= tier < len(counts):
+                counts[tier] = players
+    return counts
+
 async def ensure_player_exists(player_id: int):
-    async with aiosqlite.connect("/data/db.sqlite") as db:
+    async with aiosqlite.connect(DB_PATH) as db:
         await db.execute(
             "INSERT OR IGNORE INTO players (id) VALUES (?)", (player_id,)
         )
         await db.commit()
 
 async def get_player(player_id: int, mode: str):
-    await ensure_player_exists(player_id)
-    async with aiosqlite.connect("/data/db.sqlite") as db:
+    async with aiosqlite.connect(DB_PATH) as db:
         cursor = await db.execute(
-            f"SELECT wins_{mode}, losses_{mode}, elo_{mode} FROM players WHERE id = ?",
-            (player_id,)
+            "SELECT wins, losses, rating FROM ratings WHERE player_id = ? AND mode = ?",
+            (player_id, mode)
         )
         result = await cursor.fetchone()
-        return result or (0, 0, 1000)
+        return result or (0, 0, DEFAULT_RATING)
 
-async def update_stats(winner_id: int, loser_id: int, mode: str):
-    await ensure_player_exists(winner_id)
-    await ensure_player_exists(loser_id)
+async def get_leaderboard(mode: str, limit: int = 10):
+    async with aiosqlite.connect(DB_PATH) as db:
+        cursor = await db.execute("""
+            SELECT player_id, wins, losses, rating
+            FROM ratings
+            WHERE mode = ?
+            ORDER BY rating DESC
+            LIMIT ?
+        """, (mode, limit))
+        return await cursor.fetchall()
 
-    async with aiosqlite.connect("/data/db.sqlite") as db:
-        # Get current ELO
-        winner_cursor = await db.execute(
-            f"SELECT elo_{mode} FROM players WHERE id = ?", (winner_id,)
+async def reset_rating(player_id: int, mode: str):
+    async with aiosqlite.connect(DB_PATH) as db:
+        cursor = await db.execute(
+            "DELETE FROM ratings WHERE player_id = ? AND mode = ? RETURNING rating", (player_id, mode)
         )
-        winner_stats = await winner_cursor.fetchone()
+        row = await cursor.fetchone()
+        if row:
+            await _bump_tier(db, mode, tier_index(row[0]), -1)
+        await db.commit()
 
-        loser_cursor = await db.execute(
-            f"SELECT elo_{mode} FROM players WHERE id = ?", (loser_id,)
+async def get_history(player_id: int, opponent_id: int | None = None, before=None, limit: int = HISTORY_PAGE_SIZE):
+    """Returns up to limit results for player_id, newest first.
+
+    Pages are keyset-based: pass the (played_at, result_id) of the last row seen
+    as before to get the next page. opponent_id narrows it to one pairing."""
+    where = "player_id = ?"
+    params = [player_id]
+    if opponent_id is not None:
+        where += " AND opponent_id = ?"
+        params.append(opponent_id)
+    if before is not None:
+        where += " AND (played_at, result_id) < (?, ?)"
+        params.extend(before)
+    params.append(limit)
+    async with aiosqlite.connect(DB_PATH) as db:
+        cursor = await db.execute(f"""
+            SELECT result_id, opponent_id, mode, won, rating, rating_change, played_at
+            FROM results
+            WHERE {where}
+            ORDER BY played_at DESC, result_id DESC
+            LIMIT ?
+        """, params)
+        return await cursor.fetchall()
+
+async def get_head_to_head(player_id: int, opponent_id: int):
+    """Returns (mode, player_wins, opponent_wins) rows for every mode the pair has played."""
+    player_a, player_b = sorted((player_id, opponent_id))
+    async with aiosqlite.connect(DB_PATH) as db:
+        cursor = await db.execute(
+            "SELECT mode, a_wins, b_wins FROM head_to_head WHERE player_a = ? AND player_b = ? ORDER BY mode",
+            (player_a, player_b)
         )
-        loser_stats = await loser_cursor.fetchone()
+        rows = await cursor.fetchall()
+    if player_id == player_a:
+        return rows
+    return [(mode, b_wins, a_wins) for mode, a_wins, b_wins in rows]
 
-        winner_elo = winner_stats[0]
-        loser_elo = loser_stats[0]
+def _apply_results_sync(results):
+    """Applies (mode, winner_id, loser_id, played_at) results in order as one transaction.
+    played_at is a unix timestamp, or None for now.
 
-        # Simple ELO calculation
-        k = 32
-        expected_win = 1 / (1 + 10 ** ((loser_elo - winner_elo) / 400))
-        new_winner_elo = round(winner_elo + k * (1 - expected_win))
-        new_loser_elo = round(loser_elo - k * expected_win)
+    Runs on plain sqlite3 in a worker thread (see update_stats/import_results).
+    Ratings are read once per player and kept in memory for the batch, and all
+    writes go out as executemany calls at the end. The write lock is taken
+    before the first read, so no other writer can change a rating in between."""
+    now = int(time.time())
+    ratings = {}  # (player_id, mode) -> [rating, wins, losses, tier at batch start or None if new, last played]
+    result_rows = []
+    head_to_head = {}  # (player_a, player_b, mode) -> [a_wins, b_wins]
 
-        # Update stats
-        await db.execute(
-            f"""
-            UPDATE players SET
-                wins_{mode} = wins_{mode} + 1,
-                elo_{mode} = ?
-            WHERE id = ?
-            """, (new_winner_elo, winner_id)
-        )
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
 
-        await db.execute(
-            f"""
-            UPDATE players SET
-                losses_{mode} = losses_{mode} + 1,
-                elo_{mode} = ?
-            WHERE id = ?
-            """, (new_loser_elo, loser_id)
+        def current(player_id, mode):
+            key = (player_id, mode)
+            entry = ratings.get(key)
+            if entry is None:
+                row = conn.execute(
+                    "SELECT rating FROM ratings WHERE player_id = ? AND mode = ?", key
+                ).fetchone()
+                rating = row[0] if row else DEFAULT_RATING
+                entry = ratings[key] = [rating, 0, 0, tier_index(rating) if row else None, 0]
+            return entry
+
+        for mode, winner_id, loser_id, played_at in results:
+            played_at = now if played_at is None else played_at
+            if mode not in MODES:
+                raise ValueError(f"Unknown mode: {mode}")
+            winner = current(winner_id, mode)
+            loser = current(loser_id, mode)
+            winner_elo, loser_elo = winner[0], loser[0]
+            new_winner_elo, new_loser_elo = calculate_elo(winner_elo, loser_elo)
+            winner[0], loser[0] = new_winner_elo, new_loser_elo
+            winner[1] += 1
+            loser[2] += 1
+            winner[4] = max(winner[4], played_at)
+            loser[4] = max(loser[4], played_at)
+
+            result_rows.append((winner_id, loser_id, mode, 1, new_winner_elo, new_winner_elo - winner_elo, played_at))
+            result_rows.append((loser_id, winner_id, mode, 0, new_loser_elo, new_loser_elo - loser_elo, played_at))
+
+            player_a, player_b = sorted((winner_id, loser_id))
+            totals = head_to_head.setdefault((player_a, player_b, mode), [0, 0])
+            totals[0 if winner_id == player_a else 1] += 1
+
+        tier_deltas = {}
+        for (player_id, mode), (rating, _, _, old_tier, _) in ratings.items():
+            new_tier = tier_index(rating)
+            if old_tier != new_tier:
+                if old_tier is not None:
+                    tier_deltas[(mode, old_tier)] = tier_deltas.get((mode, old_tier), 0) - 1
+                tier_deltas[(mode, new_tier)] = tier_deltas.get((mode, new_tier), 0) + 1
+
+        conn.executemany(
+            "INSERT OR IGNORE INTO players (id) VALUES (?)",
+            {(player_id,) for player_id, _ in ratings}
+        )
+        conn.executemany("""
+            INSERT INTO ratings (player_id, mode, rating, wins, losses, games, last_played)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (player_id, mode) DO UPDATE SET
+                rating = excluded.rating,
+                wins = wins + excluded.wins,
+                losses = losses + excluded.losses,
+                games = games + excluded.games,
+                last_played = MAX(COALESCE(last_played, 0), excluded.last_played)
+            """, [
+                (player_id, mode, rating, wins, losses, wins + losses, last_played)
+                for (player_id, mode), (rating, wins, losses, _, last_played) in ratings.items()
+            ]
+        )
+        conn.executemany("""
+            INSERT INTO tier_counts (mode, tier, players) VALUES (?, ?, ?)
+            ON CONFLICT (mode, tier) DO UPDATE SET players = players + excluded.players
+            """, [(mode, tier, delta) for (mode, tier), delta in tier_deltas.items() if delta]
+        )
+        # Record the results for /history and bump the head-to-head totals
+        conn.executemany("""
+            INSERT INTO results (player_id, opponent_id, mode, won, rating, rating_change, played_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, result_rows
         )
+        conn.executemany("""
+            INSERT INTO head_to_head (player_a, player_b, mode, a_wins, b_wins)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (player_a, player_b, mode) DO UPDATE SET
+                a_wins = a_wins + excluded.a_wins,
+                b_wins = b_wins + excluded.b_wins
+            """, [(a, b, mode, a_wins, b_wins) for (a, b, mode), (a_wins, b_wins) in head_to_head.items()]
+        )
+        conn.execute("COMMIT")
+    finally:
+        # Closing without COMMIT rolls the whole batch back
+        conn.close()
+    return len(results)
 
-        await db.commit()
+async def update_stats(winner_id: int, loser_id: int, mode: str):
+    await asyncio.to_thread(_apply_results_sync, [(mode, winner_id, loser_id, None)])
 
 import json
 
 async def save_match(match_id, mode, host_id, players, teams, status, message_id=None, channel_id=None):
     players_json = json.dumps(players)
     teams_json = json.dumps(teams) if teams else None
-    async with aiosqlite.connect("/data/db.sqlite") as db:
+    async with aiosqlite.connect(DB_PATH) as db:
         await db.execute("""
             INSERT OR REPLACE INTO matches (
                 match_id, mode, host_id, players, teams, status, message_id, channel_id
@@ -107,12 +372,12 @@ async def save_match(match_id, mode, host_id, players, teams, status, message_id
 
 
 async def remove_match(match_id):
-    async with aiosqlite.connect("/data/db.sqlite") as db:
+    async with aiosqlite.connect(DB_PATH) as db:
         await db.execute("DELETE FROM matches WHERE match_id=?", (match_id,))
         await db.commit()
 
 async def get_active_matches():
-    async with aiosqlite.connect("/data/db.sqlite") as db:
+    async with aiosqlite.connect(DB_PATH) as db:
         cursor = await db.execute("SELECT match_id, mode, host_id, players, teams, status, message_id, channel_id FROM matches WHERE status = 'active'")
         rows = await cursor.fetchall()
         matches = []
@@ -130,3 +395,44 @@ async def get_active_matches():
             matches.append(match)
         return matches
 
+# ------------------- Bulk Export / Import -------------------
+EXPORT_TABLES = {
+    "ratings": (RATING_EXPORT_COLUMNS, "player_id, mode"),
+    "results": (RESULT_EXPORT_COLUMNS, "result_id"),
+}
+
+async def iter_table(table: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Yields rows of an EXPORT_TABLES table in its column order, chunk_size rows at a time."""
+    columns, order_by = EXPORT_TABLES[table]
+    async with aiosqlite.connect(DB_PATH) as db:
+        cursor = await db.execute(
+            f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order_by}"
+        )
+        while True:
+            rows = await cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
+class ImportFailed(Exception):
+    """A batch of import_results failed; applied results were committed before it."""
+
+    def __init__(self, applied: int, error: Exception):
+        super().__init__(str(error))
+        self.applied = applied
+
+async def import_results(results, batch_size: int = IMPORT_BATCH_SIZE):
+    """Applies (mode, winner_id, loser_id, played_at) results in order, one transaction per batch_size rows.
+
+    Each batch is a single worker-thread call, so the event loop only waits
+    between batches. Batches before a failing one stay committed; the failure is
+    raised as ImportFailed carrying how many results that was."""
+    results = list(results)
+    applied = 0
+    for start in range(0, len(results), batch_size):
+        try:
+            applied += await asyncio.to_thread(_apply_results_sync, results[start:start + batch_size])
+        except Exception as e:
+            raise ImportFailed(applied, e) from e
+    return applied
@@ -5,3 +5,11 @@ def update_elo(winner_elo, loser_elo, k=32):
   new_winner = round(winner_elo + k * (1 - expected_win))
   new_loser = round(loser_elo + k * (0 - expected_loss))
   return new_winner, new_loser
+
+def calculate_elo(winner_elo, loser_elo, k=32):
+  # Rating change applied to reported results (see database._apply_results_sync)
+  expected_win = 1 / (1 + 10 ** ((loser_elo - winner_elo) / 400))
+
+  new_winner = round(winner_elo + k * (1 - expected_win))
+  new_loser = round(loser_elo - k * expected_win)
+  return new_winner, new_loser
@@ -0,0 +1,118 @@
+import asyncio
+import enum
+import json
+import os
+import time
+from dataclasses import dataclass
+
+from database import MODES
+
+# ------------------- Lobby State -------------------
+class LobbyState(enum.Enum):
+    OPEN = "open"
+    COUNTDOWN = "countdown"
+    STARTED = "started"
+
+TEAM_NAMES = ("Team A", "Team B")
+
+# Open lobbies are kept as these small records. Views and message handles are
+# only built when a lobby is rendered or one of its buttons is clicked.
+@dataclass(slots=True)
+class Lobby:
+    match_id: int
+    mode: str
+    host_id: int
+    players: tuple = ()
+    teams: tuple = ()  # one tuple of player ids per team, empty for 1v1
+    state: LobbyState = LobbyState.OPEN
+    channel_id: int | None = None
+    message_id: int | None = None
+    timer_task: asyncio.Task | None = None
+
+    @property
+    def max_players(self):
+        return MODES[self.mode] * 2
+
+    @property
+    def has_teams(self):
+        return bool(self.teams)
+
+    @property
+    def is_full(self):
+        return len(self.players) == self.max_players
+
+    def team(self, name):
+        return self.teams[TEAM_NAMES.index(name)]
+
+    def team_dict(self):
+        return {name: list(team) for name, team in zip(TEAM_NAMES, self.teams)}
+
+def new_lobby(host_id, mode):
+    teams = ((host_id,), ()) if MODES[mode] > 1 else ()
+    return Lobby(match_id=host_id, mode=mode, host_id=host_id, players=(host_id,), teams=teams)
+
+def lobby_from_row(row):
+    """Builds a Lobby from a get_active_matches() row."""
+    teams = row["teams"] or {}
+    return Lobby(
+        match_id=row["match_id"],
+        mode=row["mode"],
+        host_id=row["host_id"],
+        players=tuple(row["players"]),
+        teams=tuple(tuple(teams.get(name, ())) for name in TEAM_NAMES) if teams else (),
+        channel_id=row["channel_id"],
+        message_id=row["message_id"]
+    )
+
+# ------------------- Lobby Changes -------------------
+# Pure state changes shared by the bot and tools/replay_trace.py.
+def add_player(lobby, user_id, team=None):
+    lobby.players += (user_id,)
+    if team is not None:
+        index = TEAM_NAMES.index(team)
+        lobby.teams = tuple(t + (user_id,) if i == index else t for i, t in enumerate(lobby.teams))
+
+def remove_player(lobby, user_id):
+    lobby.players = tuple(p for p in lobby.players if p != user_id)
+    lobby.teams = tuple(tuple(p for p in team if p != user_id) for team in lobby.teams)
+
+# ------------------- Warm Start Snapshot -------------------
+# Written on graceful shutdown so the next start knows which lobby messages
+# already carry live buttons and which lobbies were mid-countdown.
+SNAPSHOT_VERSION = 1
+
+def write_snapshot(path, lobbies):
+    rows = [
+        [lobby.match_id, lobby.mode, lobby.host_id, list(lobby.players),
+         [list(team) for team in lobby.teams], lobby.state.value, lobby.channel_id, lobby.message_id]
+        for lobby in lobbies
+    ]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "written_at": time.time(), "lobbies": rows}, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def read_snapshot(path):
+    """Returns {match_id: Lobby} from the snapshot and deletes it, so a stale one
+    is never reused after an unclean shutdown. Missing or unreadable -> {}."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        os.remove(path)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != SNAPSHOT_VERSION:
+        return {}
+    lobbies = {}
+    for match_id, mode, host_id, players, teams, state, channel_id, message_id in data["lobbies"]:
+        lobbies[match_id] = Lobby(
+            match_id=match_id,
+            mode=mode,
+            host_id=host_id,
+            players=tuple(players),
+            teams=tuple(tuple(team) for team in teams),
+            state=LobbyState(state),
+            channel_id=channel_id,
+            message_id=message_id
+        )
+    return lobbies
@@ -1,6 +1,9 @@
 
 
 # ------------------- Imports and Setup -------------------
+import time
+PROCESS_START = time.perf_counter()
+
 import os
 from dotenv import load_dotenv
 import discord
@@ -9,21 +12,40 @@ from discord import app_commands, Interaction, ButtonStyle
 from discord.ui import View, Button, Select
 import asyncio
 import aiosqlite
-from database import initialize, get_player, update_stats, ensure_player_exists, save_match, remove_match, get_active_matches
+import csv
+import functools
+import hashlib
+import io
+import json
+import signal
+import tempfile
+from datetime import datetime, timezone
+from database import DB_PATH, initialize, get_player, update_stats, ensure_player_exists, save_match, remove_match, get_active_matches
+from database import MODES, EXPORT_TABLES, register_mode, get_leaderboard, reset_rating, iter_table, import_results, ImportFailed
+from database import HISTORY_PAGE_SIZE, get_history, get_head_to_head, get_tier_counts
+from ranks import RANK_TIERS, get_rank_info, thumbnail_bytes
+from lobby import LobbyState, new_lobby, lobby_from_row, add_player, remove_player, write_snapshot, read_snapshot
+from tracing import emit, timed, recent_events, start_tracing, stop_tracing
 
 from threading import Thread
-from flask import Flask
-
-app = Flask(__name__)
-
-@app.route("/")
-def home():
-    return "Gundam Elo Bot is running!", 200
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Fly's HTTP service only needs something answering on 8080; the stdlib server
+# keeps Flask's import cost off the cold start path.
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = "Gundam Elo Bot is running!".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
 
 def run_web():
-    app.run(host="0.0.0.0", port=8080)
-
-Thread(target=run_web).start()
+    ThreadingHTTPServer(("0.0.0.0", 8080), HealthHandler).serve_forever()
 
 
 load_dotenv()
@@ -35,208 +57,259 @@ bot = commands.Bot(command_prefix="!", intents=intents)
 ALLOWED_MATCH_CHANNELS = ["1v1", "1v1test", "2v2"]
 matches = {}
 
-
-# ------------------- Rank Emojis -------------------
-RANK_EMOJIS = {
-    "Master": "<:Rank_Master:1395022666611691610>",
-    "Diamond": "<:Rank_Diamond:1395022649700384868>",
-    "Platinum": "<:Rank_Plat:1395022636903563365>",
-    "Gold": "<:Rank_Gold:1395022614937997343>",
-    "Silver": "<:Rank_Silver:1395022579827343400>",
-    "Bronze": "<:Rank_Bronze:1395022552346136627>",
-}
-
-# ------------------- Rank Info Function -------------------
-def get_rank_info(elo: int) -> tuple[str, str, str]:
-    if elo < 800:
-        return "Bronze", RANK_EMOJIS["Bronze"], "https://i.imgur.com/bTg35hk.png"
-    elif elo < 1000:
-        return "Silver", RANK_EMOJIS["Silver"], "https://i.imgur.com/MKggqhq.png"
-    elif elo < 1200:
-        return "Gold", RANK_EMOJIS["Gold"], "https://i.imgur.com/NEiM1M6.png"
-    elif elo < 1400:
-        return "Platinum", RANK_EMOJIS["Platinum"], "https://i.imgur.com/dOCTxJB.png"
-    elif elo < 1600:
-        return "Diamond", RANK_EMOJIS["Diamond"], "https://i.imgur.com/4yfiGqq.png"
-    else:
-        return "Master", RANK_EMOJIS["Master"], "https://i.imgur.com/EwMudQL.png"
-
-
-# ------------------- MatchView -------------------
-class MatchView(View):
-    def __init__(self, host_id, game_mode):
-        super().__init__(timeout=None)
-        self.host_id = host_id
-        self.players = [host_id]
-        self.teams = {"Team A": [host_id], "Team B": []} if game_mode == "2v2" else {}
-        self.mode = game_mode
-        self.max_players = 4 if game_mode == "2v2" else 2
-        self.match_id = host_id
-        self.message = None
-        self.timer_task = None
-        self.timer_remaining = 25
-        self.timer_active = False
-
-    async def start_match_timer(self):
-        self.timer_active = True
-        for remaining in range(25, 0, -1):
-            self.timer_remaining = remaining
-            if self.message:
-                await self.message.edit(content=self.format_message() + f"\n\n⏱️ Match starts in **{remaining}** seconds...")
-            await asyncio.sleep(1)
-        if self.message and len(self.players) == self.max_players:
-            await self.message.edit(content=self.format_message() + "\n\n✅ Match has started! Report win to end the match.")
-        self.timer_active = False
-
-    def maybe_start_timer(self):
-        if len(self.players) == self.max_players and not self.timer_active:
-            self.timer_task = asyncio.create_task(self.start_match_timer())
-
-    async def reset_timer_if_needed(self):
-        if self.timer_task and self.timer_active:
-            self.timer_task.cancel()
-            try:
-                await self.timer_task
-            except asyncio.CancelledError:
-                pass
-            self.timer_task = None
-            self.timer_active = False
-            self.timer_remaining = 25
-
-    
-    def format_message(self):
-        if self.mode == "2v2":
-            a = ', '.join(f"<@{uid}>" for uid in self.teams["Team A"])
-            b = ', '.join(f"<@{uid}>" for uid in self.teams["Team B"])
-            return f"2v2 Match hosted by <@{self.host_id}>\nTeam A: {a}\nTeam B: {b}"
-        else:
-            return f"1v1 Match hosted by <@{self.host_id}>\nPlayers: {', '.join(f'<@{p}>' for p in self.players)}"
-
-    @discord.ui.button(label="Join Match", style=ButtonStyle.primary)
-    async def join_button(self, interaction: Interaction, button: Button):
-        user_id = interaction.user.id
-        if any(user_id in match.players for match in matches.values()):
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "/data/snapshot.json")
+COMMANDS_HASH_PATH = os.getenv("COMMANDS_HASH_PATH", "/data/commands.sha256")
+DRAIN_TIMEOUT = 20  # keep below kill_timeout in fly.toml
+startup_times = {}
+draining = False
+pending = set()
+shutdown_task = None
+rerender_task = None
+unrendered = set()  # restored lobbies whose message still needs the lobby buttons
+
+# ------------------- Graceful Drain -------------------
+def drainable(callback):
+    """Tracks the interaction so shutdown can wait for it, and turns new
+    interactions away once a drain has started."""
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        interaction = next(arg for arg in args if isinstance(arg, Interaction))
+        if draining:
             await interaction.response.send_message(
-                "You're already in an active match. You must leave it before joining another.",
-                 ephemeral=True
-            )
-            return
-    
-        if user_id in self.players:
-            await interaction.response.send_message("You've already joined!", ephemeral=True)
-            return
-        if self.mode == "2v2":
-            await interaction.response.send_message(
-                "Choose a team:",
-                view=TeamSelectView(self, user_id),
+                "♻️ The bot is restarting, please try again in a few seconds.",
                 ephemeral=True
             )
-        else:
-            self.players.append(user_id)
-            await save_match(
-                match_id=self.match_id,
-                mode=self.mode,
-                host_id=self.host_id,
-                players=self.players,
-                teams=self.teams,
-                status="active",
-                message_id=self.message.id,
-                channel_id=interaction.channel.id
-            )
-            await interaction.response.edit_message(content=self.format_message(), view=self)
-            self.maybe_start_timer()
-
-    @discord.ui.button(label="Leave Match", style=ButtonStyle.secondary, custom_id="leave", row=0)
-    async def leave_button(self, interaction: Interaction, button: Button):
-        user_id = interaction.user.id
-        if user_id not in self.players:
-            await interaction.response.send_message("You're not in this match.", ephemeral=True)
             return
+        task = asyncio.current_task()
+        pending.add(task)
+        try:
+            return await callback(*args, **kwargs)
+        finally:
+            pending.discard(task)
+    return wrapper
+
+# ------------------- Game Modes -------------------
+register_mode("1v1", team_size=1)
+register_mode("2v2", team_size=2)
+MODE_CHOICES = [app_commands.Choice(name=mode, value=mode) for mode in MODES]
+
+
+# ------------------- Rank Thumbnails -------------------
+def rank_thumbnail(embed, tier):
+    """Points the embed thumbnail at the tier badge and returns the files to attach.
+    Falls back to the hosted image when the local asset is missing."""
+    data = thumbnail_bytes(tier)
+    if data is None:
+        embed.set_thumbnail(url=tier.image_url)
+        return []
+    embed.set_thumbnail(url=f"attachment://{tier.image}")
+    return [discord.File(io.BytesIO(data), filename=tier.image)]
+
+
+# ------------------- Lobby Rendering -------------------
+def format_message(lobby):
+    if lobby.has_teams:
+        a = ', '.join(f"<@{uid}>" for uid in lobby.team("Team A"))
+        b = ', '.join(f"<@{uid}>" for uid in lobby.team("Team B"))
+        return f"{lobby.mode} Match hosted by <@{lobby.host_id}>\nTeam A: {a}\nTeam B: {b}"
+    else:
+        return f"{lobby.mode} Match hosted by <@{lobby.host_id}>\nPlayers: {', '.join(f'<@{p}>' for p in lobby.players)}"
 
-        self.players.remove(user_id)
-        if self.mode == "2v2":
-            for team in self.teams.values():
-                if user_id in team:
-                    team.remove(user_id)
-
-        await self.reset_timer_if_needed()
+def lobby_message(lobby):
+    # A partial message is just the two ids; nothing is fetched from Discord and
+    # the channel cache is not needed, so this works before on_ready too
+    if lobby.channel_id is None or lobby.message_id is None:
+        return None
+    return bot.get_partial_messageable(lobby.channel_id).get_partial_message(lobby.message_id)
 
-        if not self.players:
-            # Last player just left — delete everything
-            if self.match_id in matches:
-                del matches[self.match_id]
-            await remove_match(self.match_id)
+async def save_lobby(lobby):
+    await save_match(
+        match_id=lobby.match_id,
+        mode=lobby.mode,
+        host_id=lobby.host_id,
+        players=list(lobby.players),
+        teams=lobby.team_dict(),
+        status="active",
+        message_id=lobby.message_id,
+        channel_id=lobby.channel_id
+    )
 
-            if self.message:
-                try:
-                    await self.message.delete()
-                except (discord.NotFound, discord.HTTPException, discord.Forbidden):
-                    pass
+async def close_lobby(lobby, reason):
+    # REMOVE MATCH FROM DB AND MEMORY
+    await remove_match(lobby.match_id)
+    matches.pop(lobby.match_id, None)
+    emit("removed", lobby.match_id, reason=reason)
 
-            try:
-                await interaction.response.send_message("Match ended, all players have left.", ephemeral=True)
-            except discord.InteractionResponded:
-                pass
+    # Delete the public match message for everyone else
+    message = lobby_message(lobby)
+    if message:
+        try:
+            await message.delete()
+        except (discord.NotFound, discord.HTTPException, discord.Forbidden):
+            pass
 
+# ------------------- Match Timer -------------------
+async def start_match_timer(lobby):
+    lobby.state = LobbyState.COUNTDOWN
+    emit("timer_start", lobby.match_id)
+    started = time.perf_counter()
+    for remaining in range(25, 0, -1):
+        message = lobby_message(lobby)
+        if message:
+            await message.edit(content=format_message(lobby) + f"\n\n⏱️ Match starts in **{remaining}** seconds...")
+        await asyncio.sleep(1)
+    message = lobby_message(lobby)
+    if message and lobby.is_full:
+        await message.edit(content=format_message(lobby) + "\n\n✅ Match has started! Report win to end the match.")
+    lobby.state = LobbyState.STARTED if lobby.is_full else LobbyState.OPEN
+    lobby.timer_task = None
+    emit("timer_done", lobby.match_id, state=lobby.state.value,
+         duration_ms=round((time.perf_counter() - started) * 1000, 3))
+
+def maybe_start_timer(lobby):
+    if lobby.is_full and lobby.state is not LobbyState.COUNTDOWN:
+        lobby.timer_task = asyncio.create_task(start_match_timer(lobby))
+
+async def reset_timer_if_needed(lobby):
+    if lobby.timer_task and lobby.state is LobbyState.COUNTDOWN:
+        lobby.timer_task.cancel()
+        try:
+            await lobby.timer_task
+        except asyncio.CancelledError:
+            pass
+        emit("timer_cancel", lobby.match_id)
+    lobby.timer_task = None
+    lobby.state = LobbyState.OPEN
+
+# ------------------- Lobby Buttons -------------------
+class LobbyButton(discord.ui.DynamicItem[Button], template=r"lobby:(?P<action>join|leave|report):(?P<match_id>\d+)"):
+    def __init__(self, action, match_id, **button_kwargs):
+        super().__init__(Button(custom_id=f"lobby:{action}:{match_id}", **button_kwargs))
+        self.action = action
+        self.match_id = match_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: Interaction, item: Button, match):
+        return cls(match["action"], int(match["match_id"]))
+
+    @drainable
+    async def callback(self, interaction: Interaction):
+        lobby = matches.get(self.match_id)
+        if lobby is None:
+            await interaction.response.send_message("This match is no longer active.", ephemeral=True)
             return
+        if self.action == "join":
+            await join_lobby(interaction, lobby)
+        elif self.action == "leave":
+            await leave_lobby(interaction, lobby)
+        else:
+            await report_lobby(interaction, lobby)
+
+def lobby_view(lobby):
+    view = View(timeout=None)
+    view.add_item(LobbyButton("join", lobby.match_id, label="Join Match", style=ButtonStyle.primary))
+    view.add_item(LobbyButton("leave", lobby.match_id, label="Leave Match", style=ButtonStyle.secondary, row=0))
+    view.add_item(LobbyButton("report", lobby.match_id, label="Report Win", style=ButtonStyle.success))
+    # Render-only: a stopped view is not kept in the bot's view store. Clicks are
+    # routed through LobbyButton's custom_id template instead.
+    view.stop()
+    return view
 
-        # Update match in memory + DB
-        await save_match(
-            match_id=self.match_id,
-            mode=self.mode,
-            host_id=self.host_id,
-            players=self.players,
-            teams=self.teams,
-            status="active",
-            message_id=self.message.id,
-            channel_id=interaction.channel.id
+bot.add_dynamic_items(LobbyButton)
+
+async def join_lobby(interaction: Interaction, lobby):
+    user_id = interaction.user.id
+    if any(user_id in match.players for match in matches.values()):
+        await interaction.response.send_message(
+            "You're already in an active match. You must leave it before joining another.",
+             ephemeral=True
         )
+        return
 
-        # Try updating the match message
-        try:
-            if self.message:
-                await self.message.edit(content=self.format_message(), view=self)
-        except (discord.NotFound, discord.HTTPException, discord.Forbidden):
-            pass
+    if lobby.has_teams:
+        await interaction.response.send_message(
+            "Choose a team:",
+            view=TeamSelectView(lobby, user_id),
+            ephemeral=True
+        )
+    else:
+        if lobby.is_full:
+            await interaction.response.send_message("This match is already full!", ephemeral=True)
+            return
+        add_player(lobby, user_id)
+        emit("joined", lobby.match_id, user_id=user_id)
+        await save_lobby(lobby)
+        await interaction.response.edit_message(content=format_message(lobby), view=lobby_view(lobby))
+        maybe_start_timer(lobby)
+
+async def leave_lobby(interaction: Interaction, lobby):
+    user_id = interaction.user.id
+    if user_id not in lobby.players:
+        await interaction.response.send_message("You're not in this match.", ephemeral=True)
+        return
+
+    remove_player(lobby, user_id)
+    emit("left", lobby.match_id, user_id=user_id)
+
+    await reset_timer_if_needed(lobby)
+
+    if not lobby.players:
+        # Last player just left — delete everything
+        await close_lobby(lobby, "empty")
 
         try:
-            await interaction.response.send_message("You have left the match.", ephemeral=True)
-        except (discord.InteractionResponded, discord.HTTPException):
+            await interaction.response.send_message("Match ended, all players have left.", ephemeral=True)
+        except discord.InteractionResponded:
             pass
 
+        return
 
+    # Update match in memory + DB
+    await save_lobby(lobby)
 
-    @discord.ui.button(label="Report Win", style=ButtonStyle.success)
-    async def report_button(self, interaction: Interaction, button: Button):
-        if interaction.user.id not in self.players:
-            await interaction.response.send_message("You're not part of this match.", ephemeral=True)
-            return
+    # Try updating the match message
+    try:
+        message = lobby_message(lobby)
+        if message:
+            await message.edit(content=format_message(lobby), view=lobby_view(lobby))
+    except (discord.NotFound, discord.HTTPException, discord.Forbidden):
+        pass
 
-        if self.timer_active:
-            await interaction.response.send_message(
-                "⏳ The match hasn't started yet. Please wait for the countdown to finish before reporting a win.",
-                ephemeral=True
-            )
-            return
+    try:
+        await interaction.response.send_message("You have left the match.", ephemeral=True)
+    except (discord.InteractionResponded, discord.HTTPException):
+        pass
 
-        # --- Prevent report if not enough players ---
-        if len(self.players) < self.max_players:
-            await interaction.response.send_message(
-                "⚠️ There are not enough players to report a win! If you want to end the match, simply leave.",
-                ephemeral=True
-            )
-            return
+async def report_lobby(interaction: Interaction, lobby):
+    if interaction.user.id not in lobby.players:
+        await interaction.response.send_message("You're not part of this match.", ephemeral=True)
+        return
+
+    if lobby.state is LobbyState.COUNTDOWN:
+        await interaction.response.send_message(
+            "⏳ The match hasn't started yet. Please wait for the countdown to finish before reporting a win.",
+            ephemeral=True
+        )
+        return
+
+    # --- Prevent report if not enough players ---
+    if not lobby.is_full:
+        await interaction.response.send_message(
+            "⚠️ There are not enough players to report a win! If you want to end the match, simply leave.",
+            ephemeral=True
+        )
+        return
+
+    if lobby.has_teams:
+        await interaction.response.send_message("Select winning team:", view=TeamWinSelectView(lobby), ephemeral=True)
+    else:
+        await interaction.response.send_message("Select the winner:", view=WinnerSelectView(lobby, interaction), ephemeral=True)
 
-        if self.mode == "2v2":
-            await interaction.response.send_message("Select winning team:", view=TeamWinSelectView(self), ephemeral=True)
-        else:
-            await interaction.response.send_message("Select the winner:", view=WinnerSelectView(self, interaction), ephemeral=True)
-            
 # ------------------- Team Selection View -------------------
 class TeamSelectView(View):
-    def __init__(self, match_view, user_id):
+    def __init__(self, lobby, user_id):
         super().__init__(timeout=30)
-        self.match_view = match_view
+        self.lobby = lobby
         self.user_id = user_id
         options = [
             discord.SelectOption(label="Team A", value="Team A"),
@@ -246,37 +319,32 @@ class TeamSelectView(View):
         self.select.callback = self.select_callback
         self.add_item(self.select)
 
+    @drainable
     async def select_callback(self, interaction: Interaction):
         team = self.select.values[0]
-        if self.user_id in self.match_view.players:
+        lobby = self.lobby
+        if self.user_id in lobby.players:
             await interaction.response.send_message("You're already in the match!", ephemeral=True)
             return
-        if len(self.match_view.teams[team]) >= 2:
+        if len(lobby.team(team)) >= MODES[lobby.mode]:
             await interaction.response.send_message(f"{team} is already full!", ephemeral=True)
             return
-        self.match_view.teams[team].append(self.user_id)
-        self.match_view.players.append(self.user_id)
-
-        await save_match(
-            match_id=self.match_view.match_id,
-            mode=self.match_view.mode,
-            host_id=self.match_view.host_id,
-            players=self.match_view.players,
-            teams=self.match_view.teams,
-            status="active",
-            message_id=self.match_view.message.id,
-            channel_id=interaction.channel.id
-        )
+        add_player(lobby, self.user_id, team)
+        emit("joined", lobby.match_id, user_id=self.user_id, team=team)
+
+        await save_lobby(lobby)
 
         await interaction.message.delete()
-        await self.match_view.message.edit(content=self.match_view.format_message(), view=self.match_view)
-        self.match_view.maybe_start_timer()
+        message = lobby_message(lobby)
+        if message:
+            await message.edit(content=format_message(lobby), view=lobby_view(lobby))
+        maybe_start_timer(lobby)
 
 # ------------------- Team Win Select View -------------------
 class TeamWinSelectView(View):
-    def __init__(self, match_view):
+    def __init__(self, lobby):
         super().__init__(timeout=30)
-        self.match_view = match_view
+        self.lobby = lobby
         self.select = Select(
             placeholder="Select the winning team",
             options=[
@@ -288,44 +356,38 @@ class TeamWinSelectView(View):
         self.select.callback = self.select_callback
         self.add_item(self.select)
 
+    @drainable
     async def select_callback(self, interaction: Interaction):
-        if self.match_view.timer_active:
+        if self.lobby.state is LobbyState.COUNTDOWN:
             await interaction.response.send_message("⏳ Please wait for the match to start before reporting a win.", ephemeral=True)
             return
-        if len(self.match_view.players) < self.match_view.max_players:
+        if not self.lobby.is_full:
             await interaction.response.send_message("⚠️ The match is not full. Please wait until all players join.", ephemeral=True)
             return
 
         winning_team = self.select.values[0]
         losing_team = "Team B" if winning_team == "Team A" else "Team A"
-        for winner in self.match_view.teams[winning_team]:
-            for loser in self.match_view.teams[losing_team]:
-                await update_stats(winner, loser, "2v2")
+        winners = self.lobby.team(winning_team)
+        losers = self.lobby.team(losing_team)
+        with timed("report", self.lobby.match_id, user_id=interaction.user.id, winners=winners, losers=losers):
+            for winner in winners:
+                for loser in losers:
+                    await update_stats(winner, loser, self.lobby.mode)
 
         await interaction.response.edit_message(
             content="✅ Result submitted! Thank you.",
             view=None
         )
 
-        # Delete the public match message for everyone else
-        if self.match_view.message:
-            try:
-                await self.match_view.message.delete()
-            except (discord.Forbidden, discord.NotFound):
-                pass
-
-        # REMOVE MATCH FROM DB AND MEMORY
-        await remove_match(self.match_view.match_id)
-        if self.match_view.match_id in matches:
-            del matches[self.match_view.match_id]
+        await close_lobby(self.lobby, "reported")
 
 # ------------------- Winner Select View -------------------
 class WinnerSelectView(View):
-    def __init__(self, match_view, interaction):
+    def __init__(self, lobby, interaction):
         super().__init__(timeout=30)
-        self.match_view = match_view
+        self.lobby = lobby
         options = []
-        for uid in match_view.players:
+        for uid in lobby.players:
             try:
                 user_obj = interaction.client.get_user(uid)
                 display = user_obj.display_name or user_obj.name or f"User {uid}"
@@ -340,15 +402,16 @@ class WinnerSelectView(View):
         self.select.callback = self.select_callback
         self.add_item(self.select)
 
+    @drainable
     async def select_callback(self, interaction: Interaction):
-        if self.match_view.timer_active:
+        if self.lobby.state is LobbyState.COUNTDOWN:
             await interaction.response.send_message(
                 "⏳ The match hasn't started yet. Please wait for the countdown to finish before reporting a win.",
                 ephemeral=True
             )
             return
 
-        if len(self.match_view.players) < 2:
+        if len(self.lobby.players) < 2:
             await interaction.response.send_message(
                 "⚠️ A match must have at least two players to report a result.",
                 ephemeral=True
@@ -356,9 +419,10 @@ class WinnerSelectView(View):
             return
 
         winner_id = int(self.select.values[0])
-        loser_id = [uid for uid in self.match_view.players if uid != winner_id][0]
+        loser_id = [uid for uid in self.lobby.players if uid != winner_id][0]
 
-        await update_stats(winner_id, loser_id, "1v1")
+        with timed("report", self.lobby.match_id, user_id=interaction.user.id, winners=[winner_id], losers=[loser_id]):
+            await update_stats(winner_id, loser_id, self.lobby.mode)
 
         await interaction.response.edit_message(
             content="✅ Result submitted! Thank you.",
@@ -366,25 +430,17 @@ class WinnerSelectView(View):
         )
 
         # --- Remove match from DB and memory ---
-        await remove_match(self.match_view.match_id)
-        if self.match_view.match_id in matches:
-            del matches[self.match_view.match_id]
-
-        # Optionally delete the match message for everyone else
-        if self.match_view.message:
-            try:
-                await self.match_view.message.delete()
-            except (discord.Forbidden, discord.NotFound):
-                pass
+        await close_lobby(self.lobby, "reported")
 
 @bot.tree.command(name="reset_matches_table", description="Fix the matches table")
+@drainable
 async def reset_matches_table(interaction: Interaction):
     if interaction.user.id != 228719376415719426:  # Replace with your admin ID
         await interaction.response.send_message("🚫 You do not have permission.", ephemeral=True)
         return
 
     try:
-        async with aiosqlite.connect("/data/db.sqlite") as db:
+        async with aiosqlite.connect(DB_PATH) as db:
             # Check if column exists already
             cursor = await db.execute("PRAGMA table_info(matches)")
             columns = await cursor.fetchall()
@@ -409,22 +465,20 @@ async def reset_matches_table(interaction: Interaction):
 @bot.tree.command(name="admin_report", description="Admin only: Manually report a match result")
 @app_commands.describe(
     mode="Game mode",
-    player1="1v1: First player | 2v2: Team A Player 1",
-    player2="1v1: Second player | 2v2: Team A Player 2",
-    player3="2v2: Team B Player 1",
-    player4="2v2: Team B Player 2",
-    winner="Winner (1v1: Player 1 or Player 2 | 2v2: Team A or B)"
+    player1="1v1: First player | Teams: Team A Player 1",
+    player2="1v1: Second player | Teams: next player (Team A fills first, then Team B)",
+    player3="Teams: next player (2v2: Team B Player 1)",
+    player4="Teams: next player (2v2: Team B Player 2)",
+    player5="Teams: next player (3v3: Team B Player 2)",
+    player6="Teams: next player (3v3: Team B Player 3)",
+    winner="Winner (1v1: Player 1 or Player 2 | Teams: Team A or B)"
 )
-@app_commands.choices(mode=[
-    app_commands.Choice(name="1v1", value="1v1"),
-    app_commands.Choice(name="2v2", value="2v2"),
-])
+@app_commands.choices(mode=MODE_CHOICES)
 @app_commands.choices(winner=[
-    app_commands.Choice(name="Player 1 (1v1)", value="p1"),
-    app_commands.Choice(name="Player 2 (1v1)", value="p2"),
-    app_commands.Choice(name="Team A (2v2)", value="A"),
-    app_commands.Choice(name="Team B (2v2)", value="B"),
+    app_commands.Choice(name="Player 1 / Team A", value="A"),
+    app_commands.Choice(name="Player 2 / Team B", value="B"),
 ])
+@drainable
 async def admin_report(
     interaction: Interaction,
     mode: app_commands.Choice[str],
@@ -432,7 +486,9 @@ async def admin_report(
     player2: discord.User,
     winner: app_commands.Choice[str],
     player3: discord.User = None,
-    player4: discord.User = None
+    player4: discord.User = None,
+    player5: discord.User = None,
+    player6: discord.User = None
 ):
     ADMIN_IDS = [228719376415719426]  # Replace with your real admin ID(s)
     if interaction.user.id not in ADMIN_IDS:
@@ -440,58 +496,106 @@ async def admin_report(
         return
 
     mode_value = mode.value
-    winner_value = winner.value
-
-    if mode_value == "1v1":
-        # Handle 1v1 match
-        win_id = player1.id if winner_value == "p1" else player2.id
-        lose_id = player2.id if winner_value == "p1" else player1.id
-
-        await ensure_player_exists(win_id)
-        await ensure_player_exists(lose_id)
-        await update_stats(win_id, lose_id, "1v1")
-
+    team_size = MODES[mode_value]
+    slots = [player1, player2, player3, player4, player5, player6]
+    needed = 2 * team_size
+    if needed > len(slots):
+        await interaction.response.send_message(f"⚠️ {mode_value} has more players than this command can take.", ephemeral=True)
+        return
+    if None in slots[:needed] or any(slots[needed:]):
         await interaction.response.send_message(
-            f"✅ 1v1 match result recorded:\n**Winner:** <@{win_id}>\n**Loser:** <@{lose_id}>",
+            f"⚠️ {mode_value} needs exactly {needed} players (Team A first, then Team B).",
             ephemeral=True
         )
+        return
 
-    elif mode_value == "2v2":
-        if not (player3 and player4):
-            await interaction.response.send_message("⚠️ Please provide all four players for 2v2 mode.", ephemeral=True)
-            return
-
-        team_a = [player1.id, player2.id]
-        team_b = [player3.id, player4.id]
-
-        winners = team_a if winner_value == "A" else team_b
-        losers = team_b if winner_value == "A" else team_a
+    player_ids = [player.id for player in slots[:needed]]
+    if len(set(player_ids)) != needed:
+        await interaction.response.send_message("⚠️ Each player can only be listed once.", ephemeral=True)
+        return
 
-        # Ensure all players exist
-        for uid in winners + losers:
-            await ensure_player_exists(uid)
+    team_a = player_ids[:team_size]
+    team_b = player_ids[team_size:]
+    winners = team_a if winner.value == "A" else team_b
+    losers = team_b if winner.value == "A" else team_a
 
-        # Apply ELO changes for all winner-loser pairs
-        for w in winners:
-            for l in losers:
-                await update_stats(w, l, "2v2")
+    # Ensure all players exist
+    for uid in winners + losers:
+        await ensure_player_exists(uid)
 
-        a_mentions = f"<@{team_a[0]}> + <@{team_a[1]}>"
-        b_mentions = f"<@{team_b[0]}> + <@{team_b[1]}>"
-        win_team = a_mentions if winner_value == "A" else b_mentions
+    # Apply ELO changes for all winner-loser pairs
+    for w in winners:
+        for l in losers:
+            await update_stats(w, l, mode_value)
 
+    if team_size == 1:
+        await interaction.response.send_message(
+            f"✅ {mode_value} match result recorded:\n**Winner:** <@{winners[0]}>\n**Loser:** <@{losers[0]}>",
+            ephemeral=True
+        )
+    else:
+        win_team = " + ".join(f"<@{uid}>" for uid in winners)
         await interaction.response.send_message(
-            f"✅ 2v2 match result recorded:\n**Winning Team:** {win_team}",
+            f"✅ {mode_value} match result recorded:\n**Winning Team:** {win_team}",
             ephemeral=True
         )
 
-# ------------------- Bot Ready Event -------------------
-@bot.event
-async def on_ready():
-    # 1) sanity‐check
-    print("🔔 main.py loaded – running updated code!")
-    
-    # 2) sync global slash commands
+# ------------------- Startup -------------------
+async def warm_start():
+    """Creates tables and restores open lobbies into memory.
+
+    Lobbies come from the matches table. The shutdown snapshot, when there is
+    one, says which lobby messages already carry live buttons and which
+    lobbies were mid-countdown. Returns (stale, countdown): lobbies whose
+    message needs re-rendering, and lobbies whose timer should restart."""
+    # create tables and migrate old per-mode columns
+    await initialize()
+
+    warm = await asyncio.to_thread(read_snapshot, SNAPSHOT_PATH)
+    stale, countdown = [], []
+    for row in await get_active_matches():
+        lobby = lobby_from_row(row)
+        cached = warm.get(lobby.match_id)
+        if (cached is not None and cached.players == lobby.players
+                and cached.teams == lobby.teams and cached.message_id == lobby.message_id):
+            if cached.state is LobbyState.COUNTDOWN:
+                countdown.append(lobby)
+            else:
+                lobby.state = cached.state
+        else:
+            stale.append(lobby)
+        emit("rehydrated", lobby.match_id, mode=lobby.mode, host_id=lobby.host_id,
+             team_size=MODES[lobby.mode], players=lobby.players, teams=lobby.teams, warm=cached is not None)
+        matches[lobby.match_id] = lobby
+    return stale, countdown
+
+async def rerender_lobbies(lobbies):
+    # re-render the original messages so the buttons keep working
+    for lobby in lobbies:
+        message = lobby_message(lobby)
+        if message:
+            try:
+                await message.edit(content=format_message(lobby), view=lobby_view(lobby))
+                unrendered.discard(lobby.match_id)
+                # if you had a running timer, you could restart it:
+                maybe_start_timer(lobby)
+            except Exception as e:
+                print(f"⚠️ Could not rehydrate match {lobby.match_id}: {e}")
+                emit("rehydrate_failed", lobby.match_id, error=repr(e))
+
+async def sync_commands_if_changed():
+    # Syncing on every cold start is slow and rate limited, so only sync when
+    # the command definitions differ from the last successful sync.
+    payload = json.dumps([cmd.to_dict(bot.tree) for cmd in bot.tree.get_commands()], sort_keys=True)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    try:
+        with open(COMMANDS_HASH_PATH, encoding="utf-8") as f:
+            if f.read().strip() == digest:
+                print("🔄 Slash commands unchanged, skipping sync.")
+                return
+    except OSError:
+        pass
+
     try:
         synced = await bot.tree.sync()
         print(f"🔄 Synced {len(synced)} global commands:")
@@ -499,42 +603,100 @@ async def on_ready():
             print(f"   – /{cmd.name}")
     except Exception as e:
         print(f"❌ Slash command sync failed: {e}")
-    
-    # 3) rehydrate active matches from the database
-    print("♻️ Rehydrating active matches…")
-    rows = await get_active_matches()
-    for row in rows:
-        mv = MatchView(row["host_id"], row["mode"])
-        mv.match_id = row["match_id"]
-        mv.players  = row["players"]
-        mv.teams    = row["teams"] or {}
-        # fetch the original message so the buttons keep working
-        channel = bot.get_channel(row["channel_id"])
-        if channel:
-            try:
-                msg = await channel.fetch_message(row["message_id"])
-                mv.message = msg
-                # re-attach the view so the buttons are live again
-                await msg.edit(content=mv.format_message(), view=mv)
-                # if you had a running timer, you could restart it:
-                if mv.timer_remaining and mv.timer_active is False:
-                    mv.maybe_start_timer()
-            except Exception as e:
-                print(f"⚠️ Could not rehydrate match {mv.match_id}: {e}")
-        # store it back into memory
-        matches[mv.match_id] = mv
+        return
+    try:
+        with open(COMMANDS_HASH_PATH, "w", encoding="utf-8") as f:
+            f.write(digest)
+    except OSError as e:
+        print(f"⚠️ Could not save command hash: {e}")
+
+async def shutdown(signal_name):
+    global draining
+    if draining:
+        return
+    draining = True
+    started = time.perf_counter()
+    print(f"🛑 {signal_name} received – draining {len(pending)} pending interactions…")
+    emit("drain_start", signal=signal_name, pending=len(pending))
+
+    # in-flight interactions include their DB writes
+    if pending:
+        await asyncio.wait(set(pending), timeout=DRAIN_TIMEOUT)
+
+    # Lobbies not re-rendered yet are left out of the snapshot, so the next
+    # boot re-renders them from the DB
+    if rerender_task and not rerender_task.done():
+        rerender_task.cancel()
+        try:
+            await rerender_task
+        except asyncio.CancelledError:
+            pass
+
+    # Countdowns are cut short; lobbies keep their COUNTDOWN state in the
+    # snapshot so the timer restarts on the next boot
+    for lobby in matches.values():
+        if lobby.timer_task:
+            lobby.timer_task.cancel()
+    try:
+        rendered = [lobby for lobby in matches.values() if lobby.match_id not in unrendered]
+        await asyncio.to_thread(write_snapshot, SNAPSHOT_PATH, rendered)
+    except OSError as e:
+        print(f"⚠️ Could not write snapshot: {e}")
+
+    emit("drain_done", lobbies=len(matches), unfinished=len(pending),
+         duration_ms=round((time.perf_counter() - started) * 1000, 3))
+    stop_tracing()
+    await bot.close()
 
+# ------------------- Bot Setup Hook -------------------
+@bot.event
+async def setup_hook():
+    # Runs after login and before the gateway connects, so lobbies are back in
+    # memory before the first interaction can arrive.
+    started = time.perf_counter()
+    stale, countdown = await warm_start()
+    startup_times["setup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"♻️ Restored {len(matches)} active matches ({len(stale)} to re-render).")
+
+    for lobby in countdown:
+        maybe_start_timer(lobby)
+    global rerender_task
+    unrendered.update(lobby.match_id for lobby in stale)
+    rerender_task = asyncio.create_task(rerender_lobbies(stale))
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda sig=sig: start_shutdown(sig.name))
+
+def start_shutdown(signal_name):
+    global shutdown_task
+    if shutdown_task is None:
+        shutdown_task = asyncio.create_task(shutdown(signal_name))
+
+# ------------------- Bot Ready Event -------------------
+@bot.event
+async def on_ready():
+    # on_ready fires again after every gateway reconnect; only the first one is a start
+    if "ready_ms" in startup_times:
+        print("🔌 Reconnected to the gateway.")
+        return
+    startup_times["ready_ms"] = round((time.perf_counter() - PROCESS_START) * 1000, 1)
+    print(
+        f"✅ Ready in {startup_times['ready_ms']:.0f}ms "
+        f"(imports {startup_times['import_ms']:.0f}ms, setup {startup_times.get('setup_ms', 0):.0f}ms)"
+    )
+    emit("ready", **startup_times)
+
+    await sync_commands_if_changed()
     print("✅ on_ready complete – bot is fully up and running.")
 
 
 
 # ------------------- Slash Commands -------------------
 @bot.tree.command(name="start_match", description="Start a ranked match")
-@app_commands.describe(mode="Choose between 1v1 or 2v2")
-@app_commands.choices(mode=[
-    app_commands.Choice(name="1v1", value="1v1"),
-    app_commands.Choice(name="2v2", value="2v2"),
-])
+@app_commands.describe(mode="Choose a game mode")
+@app_commands.choices(mode=MODE_CHOICES)
+@drainable
 async def start_match(interaction: Interaction, mode: app_commands.Choice[str]):
     channel = interaction.channel.name
     if channel not in ALLOWED_MATCH_CHANNELS:
@@ -544,40 +706,30 @@ async def start_match(interaction: Interaction, mode: app_commands.Choice[str]):
     if any(host_id in match.players for match in matches.values()):
         await interaction.response.send_message("You already have a match running!", ephemeral=True)
         return
-    view = MatchView(host_id, mode.value)
-    matches[host_id] = view
+    lobby = new_lobby(host_id, mode.value)
+    matches[host_id] = lobby
+    emit("created", lobby.match_id, mode=lobby.mode, host_id=host_id, team_size=MODES[lobby.mode])
 
-    await interaction.response.send_message(view.format_message(), view=view)
+    await interaction.response.send_message(format_message(lobby), view=lobby_view(lobby))
     sent = await interaction.original_response()
-    view.message = sent
+    lobby.channel_id = interaction.channel.id
+    lobby.message_id = sent.id
 
-    await save_match(
-        match_id=host_id,
-        mode=mode.value,
-        host_id=host_id,
-        players=view.players,
-        teams=view.teams,
-        status="active",
-        message_id=sent.id,
-        channel_id=interaction.channel.id
-    )
+    await save_lobby(lobby)
 
 
 
 # ------------------- Stats Command -------------------
 @bot.tree.command(name="stats", description="View your ELO, wins, and losses")
 @app_commands.describe(mode="Choose a game mode")
-@app_commands.choices(mode=[
-    app_commands.Choice(name="1v1", value="1v1"),
-    app_commands.Choice(name="2v2", value="2v2"),
-])
+@app_commands.choices(mode=MODE_CHOICES)
 async def stats(interaction: Interaction, mode: app_commands.Choice[str]):
     user_id = interaction.user.id
     wins, losses, elo = await get_player(user_id, mode.value)
-    rank, rank_emoji, image_url = get_rank_info(elo)
+    tier = get_rank_info(elo)
 
     description = (
-        f"{rank_emoji} **{rank}**\n"
+        f"{tier.emoji} **{tier.name}**\n"
         f"**ELO:** {elo}\n"
         f"**Wins:** {wins} | **Losses:** {losses}"
     )
@@ -587,37 +739,26 @@ async def stats(interaction: Interaction, mode: app_commands.Choice[str]):
         description=description,
         color=discord.Color.blue()
     )
-    embed.set_thumbnail(url=image_url)
-    await interaction.response.send_message(embed=embed)
+    files = rank_thumbnail(embed, tier)
+    await interaction.response.send_message(embed=embed, files=files)
 
 @bot.tree.command(name="leaderboard", description="View the top ranked players")
 @app_commands.describe(mode="Choose a game mode")
-@app_commands.choices(mode=[
-    app_commands.Choice(name="1v1", value="1v1"),
-    app_commands.Choice(name="2v2", value="2v2"),
-])
+@app_commands.choices(mode=MODE_CHOICES)
 async def leaderboard(interaction: Interaction, mode: app_commands.Choice[str]):
     mode_value = mode.value
-    async with aiosqlite.connect("/data/db.sqlite") as db:
-        cursor = await db.execute(f"""
-            SELECT id, wins_{mode_value}, losses_{mode_value}, elo_{mode_value}
-            FROM players
-            ORDER BY elo_{mode_value} DESC
-            LIMIT 10
-        """)
-        top_players = await cursor.fetchall()
+    top_players = await get_leaderboard(mode_value, limit=10)
 
     if not top_players:
         await interaction.response.send_message("No leaderboard data yet!", ephemeral=True)
         return
 
-    _, _, top_image_url = get_rank_info(top_players[0][3])
 
     embed = discord.Embed(
         title=f"🏆 Top 10 Leaderboard - {mode_value.upper()}",
         color=discord.Color.gold()
     )
-    embed.set_thumbnail(url=top_image_url)
+    files = rank_thumbnail(embed, get_rank_info(top_players[0][3]))
 
     for i, (player_id, wins, losses, elo) in enumerate(top_players, start=1):
         try:
@@ -626,42 +767,258 @@ async def leaderboard(interaction: Interaction, mode: app_commands.Choice[str]):
         except Exception:
             user_name = f"User {player_id}"
 
-        rank, rank_emoji, _ = get_rank_info(elo)
+        tier = get_rank_info(elo)
         embed.add_field(
-            name=f"{i}. {user_name} {rank_emoji} {rank}",
+            name=f"{i}. {user_name} {tier.emoji} {tier.name}",
             value=f"**ELO:** {elo} | **Wins:** {wins} | **Losses:** {losses}",
             inline=False
         )
 
+    await interaction.response.send_message(embed=embed, files=files)
+
+@bot.tree.command(name="ranks", description="View how many players are in each rank")
+@app_commands.describe(mode="Choose a game mode")
+@app_commands.choices(mode=MODE_CHOICES)
+async def ranks(interaction: Interaction, mode: app_commands.Choice[str]):
+    counts = await get_tier_counts(mode.value)
+    total = sum(counts)
+
+    embed = discord.Embed(
+        title=f"📊 Rank Distribution - {mode.value.upper()}",
+        color=discord.Color.gold()
+    )
+    for tier, count in reversed(list(zip(RANK_TIERS, counts))):
+        share = f"{count / total:.1%}" if total else "0.0%"
+        embed.add_field(
+            name=f"{tier.emoji} {tier.name} ({tier.min_rating}+)",
+            value=f"**Players:** {count} | {share}",
+            inline=False
+        )
+    embed.set_footer(text=f"{total} ranked players")
     await interaction.response.send_message(embed=embed)
 
+# ------------------- Match History -------------------
+def format_result_line(row):
+    _, opponent_id, mode, won, rating, rating_change, played_at = row
+    outcome = "✅ Win" if won else "❌ Loss"
+    return f"<t:{played_at}:d> {mode} {outcome} vs <@{opponent_id}> — {rating} ({rating_change:+d})"
+
+class HistoryView(View):
+    """Pages through results newest first using (played_at, result_id) keyset cursors."""
+    def __init__(self, title, player_id, opponent_id=None, header=""):
+        super().__init__(timeout=120)
+        self.title = title
+        self.player_id = player_id
+        self.opponent_id = opponent_id
+        self.header = header
+        self.cursors = [None]  # cursor used for each page shown so far
+        self.rows = []
+
+    async def load(self):
+        self.rows = await get_history(self.player_id, self.opponent_id, before=self.cursors[-1])
+        self.newer_button.disabled = len(self.cursors) == 1
+        self.older_button.disabled = len(self.rows) < HISTORY_PAGE_SIZE
+
+    def build_embed(self):
+        lines = [format_result_line(row) for row in self.rows] or ["No games recorded yet."]
+        description = (self.header + "\n\n" if self.header else "") + "\n".join(lines)
+        embed = discord.Embed(title=self.title, description=description, color=discord.Color.blue())
+        embed.set_footer(text=f"Page {len(self.cursors)}")
+        return embed
+
+    @discord.ui.button(label="◀ Newer", style=ButtonStyle.secondary)
+    async def newer_button(self, interaction: Interaction, button: Button):
+        self.cursors.pop()
+        await self.load()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @discord.ui.button(label="Older ▶", style=ButtonStyle.secondary)
+    async def older_button(self, interaction: Interaction, button: Button):
+        last = self.rows[-1]
+        self.cursors.append((last[6], last[0]))
+        await self.load()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+@bot.tree.command(name="history", description="View recent match results")
+@app_commands.describe(user="Player to look up (defaults to you)")
+async def history(interaction: Interaction, user: discord.User = None):
+    user = user or interaction.user
+    view = HistoryView(f"Match history for {user.display_name}", user.id)
+    await view.load()
+    await interaction.response.send_message(embed=view.build_embed(), view=view)
+
+@bot.tree.command(name="h2h", description="View your head-to-head record against another player")
+@app_commands.describe(opponent="Player to compare against")
+async def h2h(interaction: Interaction, opponent: discord.User):
+    user = interaction.user
+    if opponent.id == user.id:
+        await interaction.response.send_message("Pick someone other than yourself!", ephemeral=True)
+        return
+    totals = await get_head_to_head(user.id, opponent.id)
+    header = "\n".join(
+        f"**{mode}:** {wins} - {losses}" for mode, wins, losses in totals
+    ) or "No games played against each other yet."
+    view = HistoryView(f"{user.display_name} vs {opponent.display_name}", user.id, opponent.id, header=header)
+    await view.load()
+    await interaction.response.send_message(embed=view.build_embed(), view=view)
+
 @bot.tree.command(name="reset_elo", description="Admin only: Reset a player's ELO/wins/losses for a game mode")
 @app_commands.describe(user="User to reset", mode="Game mode")
-@app_commands.choices(mode=[
-    app_commands.Choice(name="1v1", value="1v1"),
-    app_commands.Choice(name="2v2", value="2v2"),
-])
+@app_commands.choices(mode=MODE_CHOICES)
+@drainable
 async def reset_elo(interaction: Interaction, user: discord.User, mode: app_commands.Choice[str]):
     ADMIN_IDS = [228719376415719426]  # Update with your admin ID
     if interaction.user.id not in ADMIN_IDS:
         await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
         return
-    await ensure_player_exists(user.id)
     mode_suffix = mode.value
-    async with aiosqlite.connect("/data/db.sqlite") as db:
-        await db.execute(
-            f"""UPDATE players SET
-                    wins_{mode_suffix}=0,
-                    losses_{mode_suffix}=0,
-                    elo_{mode_suffix}=1000
-                WHERE id=?
-            """, (user.id,)
-        )
-        await db.commit()
+    await reset_rating(user.id, mode_suffix)
     await interaction.response.send_message(
         f"Reset {user.mention}'s {mode_suffix.upper()} stats to defaults.",
         ephemeral=True
     )
 
+# ------------------- Bulk Export / Import -------------------
+@bot.tree.command(name="export", description="Admin only: Export ratings or match history as a file")
+@app_commands.describe(table="What to export", file_format="CSV or JSON lines")
+@app_commands.choices(table=[
+    app_commands.Choice(name="Ratings", value="ratings"),
+    app_commands.Choice(name="Match history", value="results"),
+])
+@app_commands.choices(file_format=[
+    app_commands.Choice(name="CSV", value="csv"),
+    app_commands.Choice(name="JSON lines", value="jsonl"),
+])
+async def export(interaction: Interaction, table: app_commands.Choice[str], file_format: app_commands.Choice[str]):
+    ADMIN_IDS = [228719376415719426]  # Update with your admin ID
+    if interaction.user.id not in ADMIN_IDS:
+        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    # Rows are streamed from the DB straight into a temp file so memory stays flat
+    raw = tempfile.TemporaryFile()
+    out = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    columns, _ = EXPORT_TABLES[table.value]
+    count = 0
+    if file_format.value == "csv":
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        async for row in iter_table(table.value):
+            writer.writerow(row)
+            count += 1
+    else:
+        async for row in iter_table(table.value):
+            out.write(json.dumps(dict(zip(columns, row))) + "\n")
+            count += 1
+    out.flush()
+    out.detach()
+    raw.seek(0)
+
+    with raw:
+        await interaction.followup.send(
+            f"📦 Exported {count} {table.name.lower()} rows.",
+            file=discord.File(raw, filename=f"{table.value}.{file_format.value}"),
+            ephemeral=True
+        )
+
+def parse_played_at(value):
+    """Unix timestamp or ISO 8601 date/time (UTC unless it has an offset); blank -> None."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    played = datetime.fromisoformat(value)
+    if played.tzinfo is None:
+        played = played.replace(tzinfo=timezone.utc)
+    return int(played.timestamp())
+
+def parse_results_csv(text: str):
+    """Parses a results CSV with a mode,winner_id,loser_id header and an optional
+    played_at column (unix time or ISO 8601; defaults to the time of import).
+    2v2 matches are listed as one row per winner/loser pair, like admin_report applies them."""
+    results = []
+    bad_lines = []
+    reader = csv.DictReader(io.StringIO(text))
+    for line_no, row in enumerate(reader, start=2):
+        try:
+            mode = row["mode"].strip()
+            winner_id = int(row["winner_id"])
+            loser_id = int(row["loser_id"])
+            played_at = parse_played_at(row.get("played_at"))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            bad_lines.append(line_no)
+            continue
+        if mode not in MODES or winner_id == loser_id:
+            bad_lines.append(line_no)
+            continue
+        results.append((mode, winner_id, loser_id, played_at))
+    return results, bad_lines
+
+@bot.tree.command(name="import_results", description="Admin only: Apply match results from a CSV (mode,winner_id,loser_id)")
+@app_commands.describe(file="CSV file with a mode,winner_id,loser_id header and optional played_at")
+@drainable
+async def import_results_command(interaction: Interaction, file: discord.Attachment):
+    ADMIN_IDS = [228719376415719426]  # Update with your admin ID
+    if interaction.user.id not in ADMIN_IDS:
+        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+    except (discord.HTTPException, UnicodeDecodeError) as e:
+        await interaction.followup.send(f"❌ Could not read attachment: `{e}`", ephemeral=True)
+        return
+
+    results, bad_lines = parse_results_csv(text)
+    if bad_lines:
+        shown = ", ".join(str(n) for n in bad_lines[:20])
+        more = f" (+{len(bad_lines) - 20} more)" if len(bad_lines) > 20 else ""
+        await interaction.followup.send(
+            f"⚠️ Nothing imported. Invalid rows on lines: {shown}{more}",
+            ephemeral=True
+        )
+        return
+
+    try:
+        applied = await import_results(results)
+    except ImportFailed as e:
+        await interaction.followup.send(
+            f"❌ Import stopped after {e.applied} of {len(results)} results (those are saved): `{e}`",
+            ephemeral=True
+        )
+        return
+    await interaction.followup.send(f"✅ Imported {applied} results.", ephemeral=True)
+
+# ------------------- Match Tracing -------------------
+@bot.tree.command(name="trace", description="Admin only: Download recent match lifecycle events")
+@app_commands.describe(match_id="Only events for this match (the host's user ID)")
+async def trace(interaction: Interaction, match_id: str = None):
+    ADMIN_IDS = [228719376415719426]  # Update with your admin ID
+    if interaction.user.id not in ADMIN_IDS:
+        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+        return
+    try:
+        events = recent_events(int(match_id) if match_id else None)
+    except ValueError:
+        await interaction.response.send_message("⚠️ match_id must be a number.", ephemeral=True)
+        return
+    if not events:
+        await interaction.response.send_message("No matching events in the trace buffer.", ephemeral=True)
+        return
+    body = "".join(json.dumps(event) + "\n" for event in events).encode("utf-8")
+    await interaction.response.send_message(
+        f"🧾 {len(events)} events.",
+        file=discord.File(io.BytesIO(body), filename="trace.jsonl"),
+        ephemeral=True
+    )
+
+startup_times["import_ms"] = round((time.perf_counter() - PROCESS_START) * 1000, 1)
+
 # ------------------- Finalize Run -------------------
-bot.run(TOKEN)
+if __name__ == "__main__":
+    Thread(target=run_web, daemon=True).start()
+    start_tracing()
+    bot.run(TOKEN)
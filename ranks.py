@@ -0,0 +1,42 @@
+import bisect
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "ranks")
+
+class RankTier(NamedTuple):
+    name: str
+    min_rating: int
+    emoji: str
+    image: str | None  # file in ASSET_DIR, built from Ranks.xcf by tools/build_rank_assets.py
+    image_url: str     # used when there is no local file
+
+# ------------------- Rank Tiers -------------------
+# Ascending by min_rating; the first tier covers everything below the second.
+RANK_TIERS = (
+    RankTier("Bronze", 0, "<:Rank_Bronze:1395022552346136627>", "bronze.png", "https://i.imgur.com/bTg35hk.png"),
+    RankTier("Silver", 800, "<:Rank_Silver:1395022579827343400>", "silver.png", "https://i.imgur.com/MKggqhq.png"),
+    RankTier("Gold", 1000, "<:Rank_Gold:1395022614937997343>", None, "https://i.imgur.com/NEiM1M6.png"),
+    RankTier("Platinum", 1200, "<:Rank_Plat:1395022636903563365>", "platinum.png", "https://i.imgur.com/dOCTxJB.png"),
+    RankTier("Diamond", 1400, "<:Rank_Diamond:1395022649700384868>", "diamond.png", "https://i.imgur.com/4yfiGqq.png"),
+    RankTier("Master", 1600, "<:Rank_Master:1395022666611691610>", "master.png", "https://i.imgur.com/EwMudQL.png"),
+)
+_THRESHOLDS = [tier.min_rating for tier in RANK_TIERS[1:]]
+
+def tier_index(elo: int) -> int:
+    return bisect.bisect_right(_THRESHOLDS, elo)
+
+def get_rank_info(elo: int) -> RankTier:
+    return RANK_TIERS[tier_index(elo)]
+
+@lru_cache(maxsize=None)
+def thumbnail_bytes(tier: RankTier):
+    """Returns the tier's PNG bytes, read from disk once, or None if the asset is missing."""
+    if tier.image is None:
+        return None
+    try:
+        with open(os.path.join(ASSET_DIR, tier.image), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
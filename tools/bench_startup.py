@@ -0,0 +1,106 @@
+"""Repeatable cold start benchmark.
+
+Starts the bot's startup path in fresh interpreters against a throwaway
+database: imports main.py, then runs warm_start() (schema check, migration,
+lobby restore). The gateway connection is not included; the live bot prints
+that as "Ready in ...ms" and emits a "ready" trace event.
+
+    python tools/bench_startup.py --runs 10 --lobbies 2000 --players 50000
+
+Each run is done cold (no snapshot) and warm (snapshot from a clean shutdown).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+stale, countdown = asyncio.run(main.warm_start())
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "setup_ms": (done - imported) * 1000,
+    "lobbies": len(main.matches),
+    "rerender": len(stale),
+}))
+"""
+
+async def seed(lobbies, players):
+    import database
+    from lobby import lobby_from_row
+    database.register_mode("1v1", team_size=1)
+    database.register_mode("2v2", team_size=2)
+    await database.initialize()
+    results = ((("1v1", "2v2")[i % 2], i % players + 1, (i * 7) % players + 2, None) for i in range(players))
+    await database.import_results(r for r in results if r[1] != r[2])
+    for i in range(lobbies):
+        host_id = 10_000_000 + i
+        if i % 2:
+            teams = {"Team A": [host_id, host_id + 1], "Team B": [host_id + 2, host_id + 3]}
+            players_in = [host_id, host_id + 1, host_id + 2, host_id + 3]
+            mode = "2v2"
+        else:
+            teams, players_in, mode = {}, [host_id, host_id + 1], "1v1"
+        await database.save_match(host_id, mode, host_id, players_in, teams, "active", 1000 + i, 42)
+    return [lobby_from_row(row) for row in await database.get_active_matches()]
+
+def run_child(env):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+def summarize(name, results):
+    print(f"{name}:")
+    for key in ("process_ms", "import_ms", "setup_ms"):
+        values = [r[key] for r in results]
+        print(f"  {key:<11} median {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+    print(f"  restored {results[-1]['lobbies']} lobbies, {results[-1]['rerender']} need re-rendering")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--lobbies", type=int, default=500, help="open lobbies to restore")
+    parser.add_argument("--players", type=int, default=5000, help="seeded results (and roughly players)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DB_PATH=os.path.join(tmp, "db.sqlite"),
+            SNAPSHOT_PATH=os.path.join(tmp, "snapshot.json"),
+            COMMANDS_HASH_PATH=os.path.join(tmp, "commands.sha256"),
+            TRACE_PATH="",
+            DISCORD_TOKEN="benchmark",
+        )
+        os.environ.update(env)
+        sys.path.insert(0, ROOT)
+        from lobby import write_snapshot
+
+        lobbies = asyncio.run(seed(args.lobbies, args.players))
+        run_child(env)  # first run migrates the fresh database; not counted
+
+        cold, warm = [], []
+        for _ in range(args.runs):
+            cold.append(run_child(env))
+            write_snapshot(env["SNAPSHOT_PATH"], lobbies)
+            warm.append(run_child(env))
+
+    summarize("cold (no snapshot)", cold)
+    summarize("warm (snapshot)", warm)
+
+if __name__ == "__main__":
+    main()
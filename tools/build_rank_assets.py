@@ -0,0 +1,185 @@
+"""Exports the rank badges in Ranks.xcf to assets/ranks/<tier>.png.
+
+Run from the repo root after editing Ranks.xcf:
+
+    python tools/build_rank_assets.py
+
+Only the RLE-compressed 8-bit XCF files GIMP saves by default are supported.
+"""
+import os
+import struct
+import sys
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ranks import ASSET_DIR, RANK_TIERS
+
+XCF_PATH = os.path.join(ROOT, "Ranks.xcf")
+
+# Layer names in Ranks.xcf -> tier name. "Pasted Layer #1" (Gold) has an opaque
+# white block painted over its top, so Gold stays on its hosted image until
+# that layer is cleaned up; then add it back here and set image in ranks.py.
+LAYER_TIERS = {
+    "Pasted Layer #3": "Bronze",
+    "Pasted Layer": "Silver",
+    "Pasted Layer #2": "Platinum",
+    "Pasted Layer #4": "Diamond",
+    "Pasted Layer #5": "Master",
+}
+
+TILE_SIZE = 64
+THUMBNAIL_SIZE = 128  # longest side; Discord shows embed thumbnails at 80px
+PROP_END = 0
+PROP_COMPRESSION = 17
+COMPRESSION_RLE = 1
+
+def read_props(data, pos):
+    props = {}
+    while True:
+        prop_id, length = struct.unpack_from(">II", data, pos)
+        pos += 8
+        if prop_id == PROP_END:
+            return props, pos
+        props[prop_id] = data[pos:pos + length]
+        pos += length
+
+def read_pointers(data, pos, fmt):
+    size = struct.calcsize(fmt)
+    pointers = []
+    while True:
+        (pointer,) = struct.unpack_from(fmt, data, pos)
+        pos += size
+        if not pointer:
+            return pointers, pos
+        pointers.append(pointer)
+
+def decode_rle(data, pos, count):
+    out = bytearray()
+    while len(out) < count:
+        op = data[pos]
+        pos += 1
+        if op >= 128:
+            if op == 128:
+                (length,) = struct.unpack_from(">H", data, pos)
+                pos += 2
+            else:
+                length = 256 - op
+            out += data[pos:pos + length]
+            pos += length
+        else:
+            if op == 127:
+                (length,) = struct.unpack_from(">H", data, pos)
+                pos += 2
+            else:
+                length = op + 1
+            out += bytes([data[pos]]) * length
+            pos += 1
+    return out, pos
+
+def read_layers(path):
+    """Yields (name, width, height, bytes_per_pixel, pixels) for every layer."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(b"gimp xcf "):
+        raise ValueError(f"{path} is not an XCF file")
+    version = int(data[10:13]) if data[9:10] == b"v" else 0
+    pointer_fmt = ">Q" if version >= 11 else ">I"
+    pointer_size = struct.calcsize(pointer_fmt)
+
+    pos = 30 if version >= 4 else 26  # magic, width, height, base type, precision
+    image_props, pos = read_props(data, pos)
+    compression = image_props.get(PROP_COMPRESSION, bytes([COMPRESSION_RLE]))[0]
+    if compression != COMPRESSION_RLE:
+        raise ValueError(f"Unsupported XCF compression: {compression}")
+
+    layer_pointers, _ = read_pointers(data, pos, pointer_fmt)
+    for layer_pointer in layer_pointers:
+        width, height, _, name_length = struct.unpack_from(">IIII", data, layer_pointer)
+        pos = layer_pointer + 16
+        name = data[pos:pos + name_length - 1].decode("utf-8")
+        _, pos = read_props(data, pos + name_length)
+        (hierarchy_pointer,) = struct.unpack_from(pointer_fmt, data, pos)
+
+        (bpp,) = struct.unpack_from(">I", data, hierarchy_pointer + 8)
+        (level_pointer,) = struct.unpack_from(pointer_fmt, data, hierarchy_pointer + 12)
+        tile_pointers, _ = read_pointers(data, level_pointer + 8, pointer_fmt)
+
+        pixels = bytearray(width * height * bpp)
+        tiles_across = (width + TILE_SIZE - 1) // TILE_SIZE
+        for i, tile_pointer in enumerate(tile_pointers):
+            tile_x = (i % tiles_across) * TILE_SIZE
+            tile_y = (i // tiles_across) * TILE_SIZE
+            tile_w = min(TILE_SIZE, width - tile_x)
+            tile_h = min(TILE_SIZE, height - tile_y)
+            pos = tile_pointer
+            # Tiles store each channel as its own RLE run
+            for channel in range(bpp):
+                values, pos = decode_rle(data, pos, tile_w * tile_h)
+                for row in range(tile_h):
+                    start = ((tile_y + row) * width + tile_x) * bpp + channel
+                    pixels[start:start + tile_w * bpp:bpp] = values[row * tile_w:(row + 1) * tile_w]
+        yield name, width, height, bpp, bytes(pixels)
+
+def downscale(width, height, bpp, pixels, max_size=THUMBNAIL_SIZE):
+    """Box-filters an 8-bit RGBA layer down so its longest side is max_size.
+    Colour is averaged premultiplied by alpha so transparent edges don't go dark."""
+    if bpp != 4:
+        raise ValueError("Only RGBA layers can be downscaled")
+    scale = max(width, height) / max_size
+    if scale <= 1:
+        return width, height, bpp, pixels
+    new_width = max(1, round(width / scale))
+    new_height = max(1, round(height / scale))
+
+    out = bytearray(new_width * new_height * 4)
+    for y in range(new_height):
+        y0 = int(y * height / new_height)
+        y1 = max(y0 + 1, int((y + 1) * height / new_height))
+        for x in range(new_width):
+            x0 = int(x * width / new_width)
+            x1 = max(x0 + 1, int((x + 1) * width / new_width))
+            r = g = b = a = 0
+            for sy in range(y0, y1):
+                row = (sy * width + x0) * 4
+                for i in range(row, row + (x1 - x0) * 4, 4):
+                    alpha = pixels[i + 3]
+                    r += pixels[i] * alpha
+                    g += pixels[i + 1] * alpha
+                    b += pixels[i + 2] * alpha
+                    a += alpha
+            count = (y1 - y0) * (x1 - x0)
+            i = (y * new_width + x) * 4
+            if a:
+                out[i:i + 4] = bytes((round(r / a), round(g / a), round(b / a), round(a / count)))
+    return new_width, new_height, 4, bytes(out)
+
+def write_png(path, width, height, bpp, pixels):
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[bpp]
+    stride = width * bpp
+    raw = b"".join(b"\0" + pixels[y * stride:(y + 1) * stride] for y in range(height))
+
+    def chunk(tag, body):
+        return struct.pack(">I", len(body)) + tag + body + struct.pack(">I", zlib.crc32(tag + body))
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 9)))
+        f.write(chunk(b"IEND", b""))
+
+def main():
+    tiers = {tier.name: tier for tier in RANK_TIERS}
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    for name, width, height, bpp, pixels in read_layers(XCF_PATH):
+        tier_name = LAYER_TIERS.get(name)
+        if tier_name is None:
+            print(f"Skipping layer {name!r}")
+            continue
+        path = os.path.join(ASSET_DIR, tiers[tier_name].image)
+        write_png(path, *downscale(width, height, bpp, pixels))
+        print(f"{name!r} -> {os.path.relpath(path, ROOT)} ({os.path.getsize(path) // 1024} KB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Replays match trace files offline against the lobby logic.
+
+    python tools/replay_trace.py /data/trace.jsonl.1 /data/trace.jsonl
+    python tools/replay_trace.py trace.jsonl --match 228719376415719426
+    python tools/replay_trace.py trace.jsonl --repeat 50   # benchmark
+
+Files are read in the order given, so pass rotated files oldest first. Every
+event is applied through lobby.py and checked against what the bot allows.
+Anything that should not have happened is printed with its boot:seq id:
+double reports, joins to full lobbies, timers that never finished, and so on.
+
+A "boot" event marks a restart. Lobbies open at that point are expected to
+come back as "rehydrated" events; any that don't are flagged.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import MODES, register_mode
+from lobby import Lobby, LobbyState, new_lobby, add_player, remove_player
+
+def event_id(event):
+    boot, seq = event.get("boot"), event.get("seq")
+    return f"{boot}:{seq}" if boot else seq
+
+def load_events(paths, match_id=None):
+    events = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"{path}:{line_no}: skipping unreadable line")
+                    continue
+                if match_id is None or event.get("match_id") in (match_id, None):
+                    events.append(event)
+    return events
+
+class Replay:
+    def __init__(self):
+        self.lobbies = {}
+        self.carried = {}  # lobbies open at the last restart, awaiting rehydration
+        self.reported = set()
+        self.anomalies = []
+        self.failures = 0
+
+    def flag(self, event, message):
+        self.anomalies.append((event_id(event), event.get("match_id"), event["event"], message))
+
+    def lobby(self, event):
+        lobby = self.lobbies.get(event["match_id"])
+        if lobby is None:
+            self.flag(event, "no open lobby")
+        return lobby
+
+    def apply(self, event):
+        handler = getattr(self, "on_" + event["event"], None)
+        if handler is not None:
+            handler(event)
+
+    def _register_mode(self, event):
+        if event["mode"] not in MODES:
+            register_mode(event["mode"], event.get("team_size", 1))
+
+    def _open(self, lobby):
+        self.lobbies[lobby.match_id] = lobby
+        self.reported.discard(lobby.match_id)
+
+    def _flag_lost(self, event_name):
+        for lobby in self.carried.values():
+            self.anomalies.append(("-", lobby.match_id, event_name, "open before a restart but never rehydrated"))
+        self.carried = {}
+
+    def on_boot(self, event):
+        self._flag_lost("boot")
+        # Timers don't survive a restart; rehydration decides what comes back
+        self.carried = self.lobbies
+        self.lobbies = {}
+
+    def on_created(self, event):
+        if event["match_id"] in self.lobbies:
+            self.flag(event, "replaces a lobby that was never removed")
+        self._register_mode(event)
+        self._open(new_lobby(event["host_id"], event["mode"]))
+
+    def on_rehydrated(self, event):
+        # Expected after a restart; traces without boot events still replay,
+        # with the rehydrated record replacing whatever was open
+        self.carried.pop(event["match_id"], None)
+        self._register_mode(event)
+        self._open(Lobby(
+            match_id=event["match_id"],
+            mode=event["mode"],
+            host_id=event["host_id"],
+            players=tuple(event["players"]),
+            teams=tuple(tuple(team) for team in event["teams"])
+        ))
+
+    def on_rehydrate_failed(self, event):
+        self.failures += 1
+        self.flag(event, f"rehydration failed: {event.get('error')}")
+
+    def on_joined(self, event):
+        lobby = self.lobby(event)
+        if lobby is None:
+            return
+        user_id = event["user_id"]
+        if any(user_id in other.players for other in self.lobbies.values()):
+            self.flag(event, f"user {user_id} is already in a lobby")
+        if lobby.is_full:
+            self.flag(event, "joined a full lobby")
+        add_player(lobby, user_id, event.get("team"))
+
+    def on_left(self, event):
+        lobby = self.lobby(event)
+        if lobby is None:
+            return
+        if event["user_id"] not in lobby.players:
+            self.flag(event, f"user {event['user_id']} left without being in the lobby")
+        remove_player(lobby, event["user_id"])
+        lobby.state = LobbyState.OPEN
+
+    def on_timer_start(self, event):
+        lobby = self.lobby(event)
+        if lobby is None:
+            return
+        if lobby.state is LobbyState.COUNTDOWN:
+            self.flag(event, "timer started while one was already running")
+        if not lobby.is_full:
+            self.flag(event, "timer started on a lobby that is not full")
+        lobby.state = LobbyState.COUNTDOWN
+
+    def on_timer_cancel(self, event):
+        lobby = self.lobby(event)
+        if lobby is not None:
+            lobby.state = LobbyState.OPEN
+
+    def on_timer_done(self, event):
+        lobby = self.lobbies.get(event["match_id"])
+        if lobby is None:
+            self.flag(event, "timer finished after the lobby was removed")
+            return
+        lobby.state = LobbyState.STARTED if lobby.is_full else LobbyState.OPEN
+
+    def on_report(self, event):
+        match_id = event["match_id"]
+        if match_id in self.reported:
+            self.flag(event, "double report")
+        lobby = self.lobbies.get(match_id)
+        if lobby is None:
+            if match_id not in self.reported:
+                self.flag(event, "report for a lobby that is not open")
+        else:
+            if lobby.state is LobbyState.COUNTDOWN:
+                self.flag(event, "reported during the countdown")
+            if not lobby.is_full:
+                self.flag(event, "reported without a full lobby")
+        if "error" in event:
+            self.flag(event, f"report failed: {event['error']}")
+        self.reported.add(match_id)
+
+    def on_removed(self, event):
+        if self.lobbies.pop(event["match_id"], None) is None:
+            self.flag(event, "removed a lobby that was not open")
+
+    def finish(self):
+        self._flag_lost("end")
+        for lobby in self.lobbies.values():
+            if lobby.state is LobbyState.COUNTDOWN:
+                self.anomalies.append(("-", lobby.match_id, "end", "timer still running at end of trace"))
+
+def replay(events):
+    state = Replay()
+    for event in events:
+        state.apply(event)
+    state.finish()
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="trace files, oldest first")
+    parser.add_argument("--match", type=int, help="only replay events for this match_id")
+    parser.add_argument("--repeat", type=int, default=1, help="replay N times and report throughput")
+    args = parser.parse_args()
+
+    events = load_events(args.paths, args.match)
+    if not events:
+        print("No events to replay.")
+        return 1
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        state = replay(events)
+    elapsed = time.perf_counter() - start
+
+    for event_ref, match_id, event, message in state.anomalies:
+        print(f"id={event_ref} match={match_id} {event}: {message}")
+
+    report_ms = [e["duration_ms"] for e in events if e["event"] == "report" and "duration_ms" in e]
+    print(f"\n{len(events)} events, {len(state.lobbies)} lobbies still open, {len(state.anomalies)} anomalies")
+    if report_ms:
+        report_ms.sort()
+        print(f"report: n={len(report_ms)} median={report_ms[len(report_ms) // 2]:.1f}ms max={report_ms[-1]:.1f}ms")
+    total = len(events) * args.repeat
+    print(f"replayed {total} events in {elapsed * 1000:.1f}ms ({total / elapsed:,.0f} events/s)")
+    return 1 if state.anomalies else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
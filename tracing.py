@@ -0,0 +1,104 @@
+"""Structured match lifecycle events.
+
+emit() appends an event to an in-memory ring buffer and hands it to a writer
+thread, which appends it as one JSON line to a rotating trace file. The event
+loop never touches the file. tools/replay_trace.py replays these files offline.
+
+The file is appended to across restarts, so every record carries the BOOT_ID
+of the process that wrote it; (boot, seq) identifies an event uniquely.
+"""
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+
+TRACE_PATH = os.getenv("TRACE_PATH", "/data/trace.jsonl")  # empty disables the file
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 3
+RING_SIZE = 2000
+BOOT_ID = uuid.uuid4().hex[:12]
+
+_ring = collections.deque(maxlen=RING_SIZE)
+_queue = queue.SimpleQueue()
+_writer = None
+_seq = 0
+
+def emit(event: str, match_id: int | None = None, **fields):
+    global _seq
+    _seq += 1
+    record = {"boot": BOOT_ID, "seq": _seq, "ts": round(time.time(), 3), "event": event, "match_id": match_id, **fields}
+    _ring.append(record)
+    if _writer is not None:
+        _queue.put(record)
+    return record
+
+class timed:
+    """Emits event with a duration_ms field when the block exits.
+
+        with timed("report", lobby.match_id, winners=winners):
+            ...
+    """
+    __slots__ = ("event", "match_id", "fields", "start")
+
+    def __init__(self, event, match_id=None, **fields):
+        self.event = event
+        self.match_id = match_id
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.fields
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = round((time.perf_counter() - self.start) * 1000, 3)
+        if exc_type is not None:
+            self.fields["error"] = repr(exc)
+        emit(self.event, self.match_id, duration_ms=duration_ms, **self.fields)
+        return False
+
+def recent_events(match_id: int | None = None, limit: int = RING_SIZE):
+    """Returns up to limit of the newest buffered events, oldest first."""
+    events = [e for e in _ring if match_id is None or e["match_id"] == match_id]
+    return events[-limit:]
+
+def _write_loop(handler):
+    while True:
+        record = _queue.get()
+        if record is None:
+            break
+        handler.emit(logging.makeLogRecord({"msg": json.dumps(record, separators=(",", ":"))}))
+    handler.close()
+
+def start_tracing(path: str = TRACE_PATH):
+    """Starts the background writer. Without it events only go to the ring buffer."""
+    global _writer
+    if _writer is not None:
+        return
+    if not path:
+        emit("boot", pid=os.getpid())
+        return
+    try:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8"
+        )
+    except OSError as e:
+        print(f"⚠️ Match tracing disabled, could not open {path}: {e}")
+        return
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _writer = threading.Thread(target=_write_loop, args=(handler,), name="trace-writer", daemon=True)
+    _writer.start()
+    emit("boot", pid=os.getpid())
+
+def stop_tracing():
+    """Flushes queued events to disk and stops the writer."""
+    global _writer
+    if _writer is None:
+        return
+    _queue.put(None)
+    _writer.join(timeout=5)
+    _writer = None